@@ -1,94 +1,220 @@
-import requests
-from flask import Flask, request, jsonify, make_response
+from flask import Blueprint, Flask, Response, request, jsonify, make_response, stream_with_context
 from flask_cors import CORS
 import os
-import psycopg2
-from flask_sqlalchemy import SQLAlchemy
-import bcrypt
-from PIL import Image
-import base64
+import html
+import re
+import click
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from sqlalchemy import text
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.middleware.proxy_fix import ProxyFix
+from models import db, Users, Avatars, Books, Chapters, Verses, save_avatar
+from cache import cache_from_env
+from upstream import UpstreamError, UpstreamUnavailable, client_from_env
+from passwords import HashQueueFull, hasher_from_env
+from ratelimit import RateLimiter
+from migrations import run_migrations
+import metrics
+
+# Pillow (avatars) and NumPy (search) are imported inside the code that needs
+# them, so a worker only pays for them once those routes are actually hit.
 
 load_dotenv()
 
-app = Flask(__name__)
-# Configure CORS to allow requests from your Vercel frontend
-CORS(app, resources={
-    r"/*": {
-        "origins": [
-            "http://localhost:3000",  # Local development
-            os.environ.get('FRONTEND_URL', '*')  # Production frontend URL
-        ],
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
-})
-
-# Database configuration with error handling
-database_url = os.environ.get('DATABASE_URL')
-if not database_url:
-    print("WARNING: DATABASE_URL not set. Database features will not work.")
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///temp.db'  # Fallback for testing
-else:
+api = Blueprint('api', __name__, cli_group=None)
+
+def database_config():
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        print("WARNING: DATABASE_URL not set. Database features will not work.")
+        return {'SQLALCHEMY_DATABASE_URI': 'sqlite:///temp.db'}  # Fallback for testing
+    
     # Fix for Render: SQLAlchemy requires 'postgresql://' but Render may provide 'postgres://'
     if database_url.startswith('postgres://'):
         database_url = database_url.replace('postgres://', 'postgresql://', 1)
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-
-class Users(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(120), nullable=False)
-    avatar = db.Column(db.LargeBinary, nullable=False)
-
-    def json(self):
-        # Convert binary avatar to base64 string for display
-        avatar_base64 = None
-        if self.avatar:
-            avatar_base64 = f"data:image/jpeg;base64,{base64.b64encode(self.avatar).decode('utf-8')}"
-        
-        return {
-            'id': self.id,
-            'username': self.username,
-            'email': self.email,
-            'password': self.password,
-            'avatar': avatar_base64
+    
+    # Each request thread holds at most one connection, so size the pool to the
+    # gunicorn thread count. Across the service that is
+    # workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections, which must stay
+    # under the Postgres plan's connection limit. Pre-ping and recycling replace
+    # connections Render drops while idle.
+    threads = int(os.environ.get('WEB_THREADS', 2))
+    return {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SQLALCHEMY_ENGINE_OPTIONS': {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', threads)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 2)),
+            'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 280)),
+            'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') != '0',
+        },
+    }
+
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(database_config())
+    # Reject oversized bodies before they are buffered; avatar uploads are the largest legitimate request
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_REQUEST_BYTES', 6 * 1024 * 1024))
+    if config:
+        app.config.update(config)
+    
+    # Behind Render's proxy the client address is in X-Forwarded-For; needed for per-IP rate limits
+    if os.environ.get('TRUSTED_PROXY_COUNT'):
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.environ['TRUSTED_PROXY_COUNT']))
+    # Configure CORS to allow requests from your Vercel frontend
+    CORS(app, resources={
+        r"/*": {
+            "origins": [
+                "http://localhost:3000",  # Local development
+                os.environ.get('FRONTEND_URL', '*')  # Production frontend URL
+            ],
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization"],
+            "expose_headers": ["X-Next-Cursor", "Link"]
         }
+    })
+    
+    db.init_app(app)
+    app.register_blueprint(api)
+    metrics.init_app(app)
+    if not API_KEY:
+        print("WARNING: API_KEY not set. Scripture not in the local store cannot be fetched.")
+    if os.environ.get('RENDER') and not os.environ.get('TRUSTED_PROXY_COUNT'):
+        print("WARNING: TRUSTED_PROXY_COUNT not set on Render. Per-IP login limits will apply to all clients at once.")
+    return app
 
-try:
-    with app.app_context():
-        db.create_all()
-        print("Database tables created successfully")
-except Exception as e:
-    print(f"WARNING: Failed to initialize database: {str(e)}")
-    print("App will continue but database features may not work")
+# Per-process services, created on first use (after gunicorn forks the worker).
+# A factory returning None isn't cached, so it is retried on the next call.
+_services = {}
+_services_lock = threading.Lock()
+
+def service(name, factory):
+    if name not in _services:
+        with _services_lock:
+            if name not in _services:
+                value = factory()
+                if value is None:
+                    return None
+                _services[name] = value
+    return _services[name]
+
+# Schema changes run once per deploy, not in every worker: flask --app app migrate
+@api.cli.command("migrate")
+def migrate():
+    applied = run_migrations(db.engine)
+    for version, description in applied:
+        print(f"Applied migration {version}: {description}")
+    print("Database schema is up to date")
 
 API_KEY = os.getenv("API_KEY")
 BIBLE_ID = "de4e12af7f28f599-02"
+API_BASE_URL = os.getenv("BIBLE_API_URL", "https://rest.api.bible/v1")
+
+# Scripture never changes, so browsers and CDNs may keep it for a long time
+SCRIPTURE_MAX_AGE = int(os.getenv("SCRIPTURE_MAX_AGE", 86400))
+
+def scripture_cache():
+    return service('scripture_cache', cache_from_env)
+
+def bible_client():
+    return service('bible_client', lambda: client_from_env(API_BASE_URL, BIBLE_ID, API_KEY))
+
+def service_metrics():
+    stats = scripture_cache().stats()
+    values = {
+        'scripture_cache_hits_total': ('counter', "Scripture cache hits in the in-process tier.", stats['hits']),
+        'scripture_cache_shared_hits_total': ('counter', "Scripture cache hits in the shared tier.", stats['shared_hits']),
+        'scripture_cache_misses_total': ('counter', "Scripture cache misses that went upstream.", stats['misses']),
+        'scripture_cache_evictions_total': ('counter', "Entries evicted from the in-process tier.", stats['evictions']),
+        'scripture_cache_entries': ('gauge', "Entries held in the in-process tier.", stats['entries']),
+    }
+    client = _services.get('bible_client')
+    if client:
+        values['upstream_circuit_open'] = ('gauge', "1 while the api.bible circuit breaker is open.", int(client.breaker.state == 'open'))
+    pool = db.engine.pool
+    if hasattr(pool, 'checkedout'):
+        values['db_pool_checked_out'] = ('gauge', "DB connections currently checked out.", pool.checkedout())
+    return values
+
+metrics.COLLECTORS.append(service_metrics)
+
+def fetch_upstream(path):
+    # Error responses raise before reaching the cache, so only successes are stored
+    client = bible_client()
+    return scripture_cache().get_or_load(path, lambda: client.fetch(path))
+
+def scripture_response(payload):
+    response = make_response(jsonify({"response": payload}), 200)
+    response.headers['Cache-Control'] = f"public, max-age={SCRIPTURE_MAX_AGE}"
+    response.add_etag()
+    return response.make_conditional(request)
+
+@api.app_errorhandler(UpstreamError)
+def upstream_error(e):
+    # api.bible errors keep their existing 200 + payload shape; only outages are 503
+    status = 503 if isinstance(e, UpstreamUnavailable) else 200
+    response = make_response(jsonify({"response": e.payload}), status)
+    response.headers['Cache-Control'] = "no-store"
+    return response
+
+VERSE_NUMBER_RE = re.compile(r'<span[^>]*class="v"[^>]*>.*?</span>', re.S)
+TAG_RE = re.compile(r'<[^>]+>')
 
-print("=" * 50)
-print("Flask app initialized successfully")
-print(f"DATABASE_URL set: {bool(os.environ.get('DATABASE_URL'))}")
-print(f"API_KEY set: {bool(API_KEY)}")
-print(f"FRONTEND_URL: {os.environ.get('FRONTEND_URL', 'Not set')}")
-print("=" * 50)
+def verse_text(content):
+    # Strip api.bible HTML (including the leading verse number) down to plain text
+    text = TAG_RE.sub(' ', VERSE_NUMBER_RE.sub(' ', content or ''))
+    return ' '.join(html.unescape(text).split())
 
-# Root route for health check
-@app.route('/', methods=['GET'])
+# Liveness: answers as long as the worker can serve requests; touches nothing else
+@api.route('/', methods=['GET'])
 def root():
     return make_response(jsonify({'status': 'ok', 'message': 'Bible Chatbot API is running'}), 200)
 
+# Readiness: checks the DB pool and reports upstream/cache health. Only the DB is
+# required; scripture can still be served from the store or cache while api.bible is down.
+@api.route('/ready', methods=['GET'])
+def ready():
+    checks = {}
+    try:
+        db.session.execute(text('SELECT 1'))
+        checks['database'] = 'ok'
+    except Exception as e:
+        checks['database'] = f"error: {str(e)}"
+    checks['database_pool'] = db.engine.pool.status()
+    
+    client = _services.get('bible_client')
+    checks['upstream'] = client.breaker.state if client else 'idle'
+    cache = scripture_cache()
+    checks['cache'] = cache.stats()
+    checks['cache_shared_tier'] = cache.shared_health()
+    
+    is_ready = checks['database'] == 'ok'
+    return make_response(jsonify({'status': 'ready' if is_ready else 'unavailable', 'checks': checks}), 200 if is_ready else 503)
+
 # Test route
-@app.route('/test', methods=['GET'])
+@api.route('/test', methods=['GET'])
 def test():
     return make_response(jsonify({'message': 'Test successful'}), 200)
 
+# bcrypt runs in a bounded process pool; login attempts are rate limited per IP and per email
+def password_hasher():
+    return service('password_hasher', hasher_from_env)
+
+login_ip_limiter = RateLimiter(int(os.getenv('LOGIN_RATE_PER_IP', 20)), window=60)
+login_email_limiter = RateLimiter(int(os.getenv('LOGIN_RATE_PER_EMAIL', 5)), window=60)
+
+def too_many_requests(message, retry_after=1):
+    response = make_response(jsonify({"error": message}), 429)
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
+
 # Sign up
-@app.route('/api/users', methods=['POST'])
+@api.route('/api/users', methods=['POST'])
 def signup():
     try:
         # Get form data instead of JSON
@@ -101,20 +227,34 @@ def signup():
             return make_response(jsonify({"error": "Username, email, and password are required"}), 400)
         
         # Hash the password before storing
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        hashed_password = password_hasher().hash(password)
         
-        # Read avatar file if provided
-        avatar_bytes = avatar_file.read() if avatar_file else None
+        # Validate and resize the avatar up front so a bad upload rejects the signup
+        thumbnails = None
+        if avatar_file:
+            from avatars import MAX_UPLOAD_BYTES, InvalidAvatar, make_thumbnails
+            try:
+                # One byte past the limit is enough for make_thumbnails to reject it
+                thumbnails = make_thumbnails(avatar_file.read(MAX_UPLOAD_BYTES + 1))
+            except InvalidAvatar as e:
+                return make_response(jsonify({"error": str(e)}), 400)
         
-        new_user = Users(username=username, email=email, password=hashed_password.decode('utf-8'), avatar=avatar_bytes)
+        new_user = Users(username=username, email=email, password=hashed_password, avatar=b'')
         db.session.add(new_user)
+        db.session.flush()
+        if thumbnails:
+            save_avatar(new_user.id, *thumbnails)
         db.session.commit()
         return make_response(jsonify({"id": new_user.id, "username": new_user.username, "email": new_user.email}), 201)
+    except RequestEntityTooLarge:
+        return make_response(jsonify({"error": "Upload is too large"}), 413)
+    except HashQueueFull:
+        return too_many_requests("Server is busy, please try again")
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 500)
 
 # Login
-@app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/auth/login', methods=['POST'])
 def login():
     try:
         data = request.get_json()
@@ -123,6 +263,13 @@ def login():
         
         if not email or not password:
             return make_response(jsonify({"error": "Email and password are required"}), 400)
+        if not isinstance(email, str) or not isinstance(password, str):
+            return make_response(jsonify({"error": "Invalid credentials"}), 401)
+        
+        # Throttle before touching the DB or bcrypt so credential stuffing can't burn CPU
+        retry_after = login_ip_limiter.hit(request.remote_addr) or login_email_limiter.hit(email.lower())
+        if retry_after:
+            return too_many_requests("Too many login attempts, please try again later", retry_after)
         
         # Find user by email
         user = Users.query.filter_by(email=email).first()
@@ -131,12 +278,13 @@ def login():
             print(f"User not found with email: {email}")
             return make_response(jsonify({"error": "Invalid credentials"}), 401)
         
-        print(f"Found user: {user.email}")
-        print(f"Stored password hash starts with: {user.password[:10]}")
-        
         # Check password
         try:
-            if bcrypt.checkpw(password.encode('utf-8'), user.password.encode('utf-8')):
+            if password_hasher().check(password, user.password):
+                # Re-hash with the current cost factor after BCRYPT_ROUNDS is raised
+                if password_hasher().needs_rehash(user.password):
+                    user.password = password_hasher().hash(password)
+                    db.session.commit()
                 return make_response(jsonify({
                     "id": user.id,
                     "username": user.username,
@@ -145,29 +293,65 @@ def login():
             else:
                 print("Password check failed")
                 return make_response(jsonify({"error": "Invalid credentials"}), 401)
-        except Exception as bcrypt_error:
+        except ValueError as bcrypt_error:
             print(f"Bcrypt error: {str(bcrypt_error)}")
             print("This likely means the password in DB is not bcrypt-hashed")
             return make_response(jsonify({"error": "Invalid credentials"}), 401)
+    except HashQueueFull:
+        return too_many_requests("Server is busy, please try again")
     except Exception as e:
         print(f"Login error: {str(e)}")
         return make_response(jsonify({"error": str(e)}), 500)
 
-# Get all users
-@app.route("/api/users", methods=['GET'])
+USERS_PAGE_MAX = 1000
+USERS_EXPORT_BATCH = 1000
+
+def user_listing(after, limit):
+    # Keyset page over the covering index; never loads the password or avatar columns
+    rows = db.session.query(Users.id, Users.username, Users.email) \
+        .filter(Users.id > after).order_by(Users.id).limit(limit).all()
+    return [{'id': row.id, 'username': row.username, 'email': row.email} for row in rows]
+
+# Get all users: ?limit=&after= returns one page (next cursor in X-Next-Cursor),
+# without them the whole table is streamed in batches
+@api.route("/api/users", methods=['GET'])
 def get_users():
     try:
-        users = Users.query.all()
-        users_data = [{'id': user.id, 'username': user.username, 'email': user.email} for user in users]
-        return jsonify(users_data), 200
+        if 'limit' not in request.args and 'after' not in request.args:
+            def generate():
+                last_id = 0
+                yield '['
+                while True:
+                    batch = user_listing(last_id, USERS_EXPORT_BATCH)
+                    for i, user in enumerate(batch):
+                        yield (',' if last_id or i else '') + json.dumps(user)
+                    if len(batch) < USERS_EXPORT_BATCH:
+                        break
+                    last_id = batch[-1]['id']
+                yield ']'
+            return Response(stream_with_context(generate()), mimetype='application/json')
+        
+        # Without a default, values that aren't integers come back as None
+        after = request.args.get('after', type=int) if 'after' in request.args else 0
+        limit = request.args.get('limit', type=int) if 'limit' in request.args else 100
+        if after is None or limit is None:
+            return make_response(jsonify({"error": "limit and after must be integers"}), 400)
+        limit = max(1, min(limit, USERS_PAGE_MAX))
+        users_data = user_listing(after, limit)
+        response = make_response(jsonify(users_data), 200)
+        if len(users_data) == limit:
+            next_cursor = users_data[-1]['id']
+            response.headers['X-Next-Cursor'] = str(next_cursor)
+            response.headers['Link'] = f'<{request.path}?limit={limit}&after={next_cursor}>; rel="next"'
+        return response
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 500)
 
 # Get user by id
-@app.route('/api/users/<int:id>', methods=['GET'])
+@api.route('/api/users/<int:id>', methods=['GET'])
 def get_user(id):
     try:
-        user = Users.query.filter_by(id=id).first()
+        user = db.session.get(Users, id)
         if user:
             user_data = user.json()
             return make_response(jsonify({"user": user_data}), 200)
@@ -177,7 +361,7 @@ def get_user(id):
         return make_response(jsonify({"error": str(e)}), 500)
 
 # Update user by id
-@app.route('/api/users/<int:id>', methods=['PUT'])
+@api.route('/api/users/<int:id>', methods=['PUT'])
 def update_user(id):
     try:
         user = Users.query.filter_by(id=id).first()
@@ -185,20 +369,23 @@ def update_user(id):
             data = request.get_json()
             user.username = data['username']
             user.email = data['email']
-            user.password = data['password']
+            user.password = password_hasher().hash(data['password'])
             db.session.commit()
             return make_response(jsonify({"user": user.json()}), 200)
         else:
             return make_response(jsonify({"error": "User not found"}), 404)
+    except HashQueueFull:
+        return too_many_requests("Server is busy, please try again")
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 500)
 
 # Delete user by id
-@app.route('/api/users/<int:id>', methods=['DELETE'])
+@api.route('/api/users/<int:id>', methods=['DELETE'])
 def delete_user(id):
     try:
         user = Users.query.filter_by(id=id).first()
         if user:
+            Avatars.query.filter_by(user_id=id).delete()
             db.session.delete(user)
             db.session.commit()
             return make_response(jsonify({"message": "User deleted successfully"}), 200)
@@ -207,44 +394,368 @@ def delete_user(id):
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 500)
 
+# Upload or replace a user's avatar
+@api.route('/api/users/<int:id>/avatar', methods=['PUT'])
+def update_avatar(id):
+    try:
+        user = Users.query.filter_by(id=id).first()
+        if not user:
+            return make_response(jsonify({"error": "User not found"}), 404)
+        avatar_file = request.files.get('avatar')
+        if not avatar_file:
+            return make_response(jsonify({"error": "Avatar file is required"}), 400)
+        from avatars import MAX_UPLOAD_BYTES, InvalidAvatar, make_thumbnails
+        try:
+            thumbnails = make_thumbnails(avatar_file.read(MAX_UPLOAD_BYTES + 1))
+        except InvalidAvatar as e:
+            return make_response(jsonify({"error": str(e)}), 400)
+        
+        save_avatar(id, *thumbnails)
+        db.session.commit()
+        return make_response(jsonify({"user": user.json()}), 200)
+    except RequestEntityTooLarge:
+        return make_response(jsonify({"error": "Upload is too large"}), 413)
+    except Exception as e:
+        return make_response(jsonify({"error": str(e)}), 500)
+
+def migrate_legacy_avatar(id):
+    # Users created before the avatars table still hold their raw upload in users.avatar
+    raw = db.session.query(Users.avatar).filter_by(id=id).scalar()
+    if not raw:
+        return False
+    from avatars import InvalidAvatar, make_thumbnails
+    try:
+        save_avatar(id, *make_thumbnails(raw))
+    except InvalidAvatar as e:
+        # Drop the unusable blob so later requests don't decode it again
+        print(f"Could not convert legacy avatar for user {id}, discarding it: {str(e)}")
+        Users.query.filter_by(id=id).update({'avatar': b''})
+        db.session.commit()
+        return False
+    Users.query.filter_by(id=id).update({'avatar': b''})
+    db.session.commit()
+    return True
+
+# Serve an avatar thumbnail: ?size=<px> picks the nearest generated size, WebP when accepted
+@api.route('/api/users/<int:id>/avatar', methods=['GET'])
+def get_avatar(id):
+    from avatars import MIME_TYPES, pick_size
+    try:
+        size = pick_size(request.args.get('size', 256, type=int))
+        fmt = request.args.get('format')
+        if fmt not in MIME_TYPES:
+            fmt = 'webp' if any(mime == 'image/webp' for mime, _ in request.accept_mimetypes) else 'jpeg'
+        
+        # Look up only the digest first so a 304 never loads the image bytes
+        query = db.session.query(Avatars.id, Avatars.digest).filter_by(user_id=id, size=size, format=fmt)
+        row = query.first()
+        if not row and migrate_legacy_avatar(id):
+            row = query.first()
+        if not row:
+            return make_response(jsonify({"error": "Avatar not found"}), 404)
+        
+        if request.args.get('v') == row.digest[:16]:
+            cache_control = "public, max-age=31536000, immutable"
+        else:
+            cache_control = "public, max-age=0, must-revalidate"
+        etag = f"{row.digest[:16]}-{size}-{fmt}"
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            data = db.session.query(Avatars.data).filter_by(id=row.id).scalar()
+            response = make_response(data, 200)
+            response.headers['Content-Type'] = MIME_TYPES[fmt]
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        response.headers['Vary'] = 'Accept'
+        return response
+    except Exception as e:
+        return make_response(jsonify({"error": str(e)}), 500)
+
 # Get bible
-@app.route('/api/bibles')
+@api.route('/api/bibles')
 def get_bibles():
     book = request.args.get('book', 'GEN')
     chapter = request.args.get('chapter', '1')
     
     chapter_id = f"{book}.{chapter}"
-    url = f"https://rest.api.bible/v1/bibles/{BIBLE_ID}/chapters/{chapter_id}"
+    stored = db.session.get(Chapters, chapter_id)
+    if stored:
+        return scripture_response(stored.payload)
     
-    response = requests.get(url, headers={"api-key": API_KEY})
-    return {"response": response.json()}
+    return scripture_response(fetch_upstream(f"chapters/{chapter_id}"))
 
 # Get books
-@app.route("/api/books")
+@api.route("/api/books")
 def get_books():
-    url = f"https://rest.api.bible/v1/bibles/{BIBLE_ID}/books"
+    books = Books.query.order_by(Books.position).all()
+    if books:
+        return scripture_response({"data": [book.payload for book in books]})
     
-    response = requests.get(url, headers={"api-key": API_KEY})
-    return {"response": response.json()}
+    return scripture_response(fetch_upstream("books"))
 
-@app.route("/api/scripture")
+@api.route("/api/scripture")
 def get_scripture():
     verse_id = request.args.get('verse_id', 'GEN.1.1')
-    url = f"https://rest.api.bible/v1/bibles/{BIBLE_ID}/verses/{verse_id}"
+    stored = db.session.get(Verses, verse_id)
+    if stored:
+        return scripture_response(stored.payload)
     
-    response = requests.get(url, headers={"api-key": API_KEY})
-    return {"response": response.json()}
+    return scripture_response(fetch_upstream(f"verses/{verse_id}"))
 
-@app.route("/api/chapter")
+@api.route("/api/chapter")
 def get_chapter():
     chapter_id = request.args.get('chapter_id', 'GEN.1')
+    stored = db.session.get(Chapters, chapter_id)
+    if stored:
+        return scripture_response(stored.verses_payload)
     
-    url = f"https://rest.api.bible/v1/bibles/{BIBLE_ID}/chapters/{chapter_id}/verses"
+    return scripture_response(fetch_upstream(f"chapters/{chapter_id}/verses"))
+
+# Verse search, built offline with `flask --app app build-search-index`.
+# Opened once per worker on first use; the arrays are memory-mapped so workers share pages.
+# Until meta.json exists each request checks again, so a freshly built index is picked up.
+SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_index"))
+
+def load_search_index():
+    if not os.path.exists(os.path.join(SEARCH_INDEX_DIR, 'meta.json')):
+        return None
+    try:
+        from search import SearchIndex
+        return SearchIndex(SEARCH_INDEX_DIR)
+    except Exception as e:
+        print(f"WARNING: Failed to load search index: {str(e)}")
+        return None
+
+def search_index():
+    return service('search_index', load_search_index)
+
+@api.route("/api/search", methods=['GET', 'POST'])
+def search_verses():
+    from search import testament
+    index = search_index()
+    if index is None:
+        return make_response(jsonify({"error": "Search index has not been built"}), 503)
     
-    response = requests.get(url, headers={"api-key": API_KEY})
-    return {"response": response.json()}
+    data = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+    if not isinstance(data, dict):
+        return make_response(jsonify({"error": "Request body must be a JSON object"}), 400)
+    query = data.get('q', request.args.get('q', ''))
+    if not isinstance(query, str):
+        return make_response(jsonify({"error": "q must be a string"}), 400)
+    books = data.get('book') or request.args.getlist('book')
+    if isinstance(books, str):
+        books = [books]
+    if not isinstance(books, list) or not all(isinstance(book, str) for book in books):
+        return make_response(jsonify({"error": "book must be a book id or a list of book ids"}), 400)
+    testament_filter = data.get('testament') or request.args.get('testament') or ''
+    if not isinstance(testament_filter, str) or testament_filter.upper() not in ('', 'OT', 'NT'):
+        return make_response(jsonify({"error": "testament must be OT or NT"}), 400)
+    testament_filter = testament_filter.upper() or None
+    try:
+        limit = min(int(data.get('limit', request.args.get('limit', 10))), 100)
+    except (TypeError, ValueError):
+        return make_response(jsonify({"error": "limit must be an integer"}), 400)
+    
+    started = time.perf_counter()
+    try:
+        # Semantic search takes a query vector, or finds verses similar to a given verse
+        similar_to = data.get('similar_to') or request.args.get('similar_to')
+        vector = data.get('vector')
+        if similar_to and vector is None:
+            vector = index.embedding_for(similar_to)
+            if vector is None:
+                return make_response(jsonify({"error": f"No embedding for {similar_to}"}), 404)
+        if vector is not None:
+            hits = index.similar(vector, limit, books, testament_filter)
+        elif query.strip():
+            hits = index.search(query, limit, books, testament_filter)
+        else:
+            return make_response(jsonify({"error": "q, vector or similar_to is required"}), 400)
+    except (TypeError, ValueError) as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+    
+    verses = {verse.id: verse for verse in Verses.query.filter(Verses.id.in_([verse_id for verse_id, _ in hits]))}
+    results = [{
+        'id': verse_id,
+        'book_id': verses[verse_id].book_id if verse_id in verses else verse_id.split('.')[0],
+        'chapter_id': verses[verse_id].chapter_id if verse_id in verses else verse_id.rsplit('.', 1)[0],
+        'testament': testament(verse_id.split('.')[0]),
+        'text': verses[verse_id].text if verse_id in verses else None,
+        'score': score
+    } for verse_id, score in hits]
+    took_ms = (time.perf_counter() - started) * 1000
+    return make_response(jsonify({"results": results, "took_ms": round(took_ms, 3)}), 200)
+
+@api.cli.command("build-search-index")
+@click.option('--embeddings', 'embeddings_path', default=None, help="Optional .npy matrix with one row per verse, in canonical order")
+@click.option('--output', default=None, help="Index directory (defaults to SEARCH_INDEX_DIR)")
+def build_search_index(embeddings_path, output):
+    rows = db.session.query(Verses.id, Verses.book_id, Verses.text) \
+        .join(Chapters, Verses.chapter_id == Chapters.id) \
+        .join(Books, Chapters.book_id == Books.id) \
+        .order_by(Books.position, Chapters.position, Verses.position).all()
+    if not rows:
+        raise click.ClickException("No verses stored; run `flask --app app ingest-bible` first")
+    
+    from search import build_index
+    embeddings = None
+    if embeddings_path:
+        import numpy as np
+        embeddings = np.load(embeddings_path)
+    build_index(output or SEARCH_INDEX_DIR, [tuple(row) for row in rows], embeddings)
+    print(f"Indexed {len(rows)} verses into {output or SEARCH_INDEX_DIR}")
+
+# Batch scripture lookup: verses (JHN.3.16), ranges (JHN.3.16-JHN.3.21) and chapters (ROM.8)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 500))
+# Checked before anything is resolved, since each chapter of a range may need an upstream call
+BATCH_MAX_REFERENCES = int(os.getenv("BATCH_MAX_REFERENCES", 50))
+BATCH_MAX_RANGE_CHAPTERS = int(os.getenv("BATCH_MAX_RANGE_CHAPTERS", 10))
+VERSE_REF_RE = re.compile(r'^[0-9A-Z]+\.\d+\.\d+$')
+CHAPTER_REF_RE = re.compile(r'^[0-9A-Z]+\.\d+$')
+
+def chapter_verse_ids(chapter_id):
+    rows = db.session.query(Verses.id).filter_by(chapter_id=chapter_id).order_by(Verses.position).all()
+    if rows:
+        return [row.id for row in rows]
+    return [verse['id'] for verse in fetch_upstream(f"chapters/{chapter_id}/verses")['data']]
+
+def expand_range(start, end):
+    book, start_chapter, _ = start.split('.')
+    end_book, end_chapter, _ = end.split('.')
+    if book != end_book or int(end_chapter) < int(start_chapter):
+        raise ValueError(f"Invalid range: {start}-{end}")
+    if int(end_chapter) - int(start_chapter) + 1 > BATCH_MAX_RANGE_CHAPTERS:
+        raise ValueError(f"Ranges may span at most {BATCH_MAX_RANGE_CHAPTERS} chapters: {start}-{end}")
+    
+    verse_ids = []
+    for number in range(int(start_chapter), int(end_chapter) + 1):
+        verse_ids.extend(chapter_verse_ids(f"{book}.{number}"))
+    if start not in verse_ids or end not in verse_ids or verse_ids.index(end) < verse_ids.index(start):
+        raise ValueError(f"Invalid range: {start}-{end}")
+    return verse_ids[verse_ids.index(start):verse_ids.index(end) + 1]
+
+def resolve_reference(reference):
+    # Returns the (kind, id) items a reference covers, in reading order
+    if '-' in reference:
+        start, _, end = reference.partition('-')
+        if not VERSE_REF_RE.match(start) or not VERSE_REF_RE.match(end):
+            raise ValueError(f"Invalid reference: {reference}")
+        return [('verse', verse_id) for verse_id in expand_range(start, end)]
+    if VERSE_REF_RE.match(reference):
+        return [('verse', reference)]
+    if CHAPTER_REF_RE.match(reference):
+        return [('chapter', reference)]
+    raise ValueError(f"Invalid reference: {reference}")
+
+def load_scripture(kind, item_id):
+    if kind == 'chapter':
+        return fetch_upstream(f"chapters/{item_id}/verses")
+    return fetch_upstream(f"verses/{item_id}")
+
+@api.route("/api/scripture/batch", methods=['GET', 'POST'])
+def get_scripture_batch():
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        if not isinstance(body, dict):
+            return make_response(jsonify({"error": "Request body must be a JSON object"}), 400)
+        references = body.get('references')
+    else:
+        references = [ref for ref in request.args.get('refs', '').split(',') if ref]
+    if not references or not isinstance(references, list):
+        return make_response(jsonify({"error": "A list of references is required"}), 400)
+    if len(references) > BATCH_MAX_REFERENCES:
+        return make_response(jsonify({"error": f"At most {BATCH_MAX_REFERENCES} references per batch"}), 400)
+    
+    try:
+        items = [(reference, item) for reference in references for item in resolve_reference(str(reference).strip())]
+    except UpstreamUnavailable:
+        # An outage isn't the client's fault; upstream_error answers 503
+        raise
+    except (ValueError, UpstreamError) as e:
+        return make_response(jsonify({"error": f"Could not resolve references: {str(e)}"}), 400)
+    if len(items) > BATCH_MAX_ITEMS:
+        return make_response(jsonify({"error": f"At most {BATCH_MAX_ITEMS} verses/chapters per batch"}), 400)
+    
+    # Answer what we can from the local store in one query per kind; only misses go upstream
+    unique = set(item for _, item in items)
+    verse_ids = [item_id for kind, item_id in unique if kind == 'verse']
+    chapter_ids = [item_id for kind, item_id in unique if kind == 'chapter']
+    results = {}
+    if verse_ids:
+        for verse in Verses.query.filter(Verses.id.in_(verse_ids)):
+            results[('verse', verse.id)] = verse.payload
+    if chapter_ids:
+        for chapter in Chapters.query.filter(Chapters.id.in_(chapter_ids)):
+            results[('chapter', chapter.id)] = chapter.verses_payload
+    misses = [item for item in unique if item not in results]
+    
+    def generate():
+        executor = ThreadPoolExecutor(max_workers=max(1, min(bible_client().pool_size, len(misses))))
+        try:
+            futures = {item: executor.submit(load_scripture, *item) for item in misses}
+            for reference, item in items:
+                line = {"request": reference, "reference": item[1]}
+                try:
+                    line["response"] = results[item] if item in results else futures[item].result()
+                except UpstreamError as e:
+                    line["error"] = e.payload
+                yield json.dumps(line) + '\n'
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Pull the whole translation into the local store: flask --app app ingest-bible
+@api.cli.command("ingest-bible")
+@click.option('--book', 'only_books', multiple=True, help="Only ingest these book ids (e.g. --book JHN)")
+@click.option('--refresh', is_flag=True, help="Re-fetch books that are already stored")
+def ingest_bible(only_books, refresh):
+    books = bible_client().fetch("books")['data']
+    # Every book is stored so /api/books stays complete; --book only limits chapters and verses
+    for position, book in enumerate(books):
+        db.session.merge(Books(id=book['id'], position=position, payload=book))
+    db.session.commit()
+    
+    # Chapters and verses are committed once per book, so a stored chapter means the
+    # book finished; a re-run after an interruption resumes with the next book
+    stored_books = {row.book_id for row in db.session.query(Chapters.book_id).distinct()}
+    for book in books:
+        if only_books and book['id'] not in only_books:
+            continue
+        if book['id'] in stored_books and not refresh:
+            print(f"Skipping {book['id']} (already stored; use --refresh to re-fetch)")
+            continue
+        chapters = bible_client().fetch(f"books/{book['id']}/chapters")['data']
+        for chapter_position, chapter in enumerate(chapters):
+            verses_payload = bible_client().fetch(f"chapters/{chapter['id']}/verses")
+            db.session.merge(Chapters(
+                id=chapter['id'],
+                book_id=book['id'],
+                position=chapter_position,
+                payload=bible_client().fetch(f"chapters/{chapter['id']}"),
+                verses_payload=verses_payload
+            ))
+            verses = verses_payload['data']
+            payloads = bible_client().fetch_many(f"verses/{verse['id']}" for verse in verses)
+            for verse_position, (verse, payload) in enumerate(zip(verses, payloads)):
+                db.session.merge(Verses(
+                    id=verse['id'],
+                    book_id=book['id'],
+                    chapter_id=chapter['id'],
+                    position=verse_position,
+                    text=verse_text(payload['data'].get('content')),
+                    payload=payload
+                ))
+        # Commit per book so an interrupted run keeps what it already fetched
+        db.session.commit()
+        print(f"Ingested {book['id']} ({len(chapters)} chapters)")
     
 
 if __name__ == '__main__':
+    app = create_app()
+    # Local development convenience; deployments run `flask --app app migrate` instead
+    with app.app_context():
+        run_migrations(db.engine)
     port = int(os.environ.get('PORT', 4000))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
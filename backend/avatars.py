@@ -0,0 +1,62 @@
+import hashlib
+import io
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+MAX_PIXELS = 40_000_000
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+
+# Square thumbnail edge lengths and the encodings generated for each
+THUMBNAIL_SIZES = (64, 256)
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+MIME_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+class InvalidAvatar(ValueError):
+    pass
+
+
+def make_thumbnails(raw):
+    """Validate an uploaded image and render every thumbnail size/format.
+
+    Returns (digest, {(size, fmt): bytes}); digest is the SHA-256 of the
+    upload, so identical uploads map to identical thumbnail URLs.
+    """
+    if not raw:
+        raise InvalidAvatar("Avatar file is empty")
+    if len(raw) > MAX_UPLOAD_BYTES:
+        raise InvalidAvatar(f"Avatar must be at most {MAX_UPLOAD_BYTES // (1024 * 1024)}MB")
+
+    try:
+        # verify() catches truncated/corrupt files but leaves the image unusable, so reopen after
+        with Image.open(io.BytesIO(raw)) as probe:
+            if probe.format not in ALLOWED_FORMATS:
+                raise InvalidAvatar(f"Unsupported image format: {probe.format}")
+            if probe.width * probe.height > MAX_PIXELS:
+                raise InvalidAvatar("Avatar dimensions are too large")
+            probe.verify()
+        image = Image.open(io.BytesIO(raw))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+        raise InvalidAvatar("Avatar is not a valid image")
+
+    thumbnails = {}
+    for size in THUMBNAIL_SIZES:
+        thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        for fmt, (pil_format, options) in THUMBNAIL_FORMATS.items():
+            out = io.BytesIO()
+            thumbnail.save(out, pil_format, **options)
+            thumbnails[(size, fmt)] = out.getvalue()
+    return hashlib.sha256(raw).hexdigest(), thumbnails
+
+
+def pick_size(requested):
+    """Smallest generated size that covers the requested edge length."""
+    for size in THUMBNAIL_SIZES:
+        if requested <= size:
+            return size
+    return THUMBNAIL_SIZES[-1]
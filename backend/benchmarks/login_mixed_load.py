@@ -0,0 +1,165 @@
+"""Logins/sec and scripture-route latency while logins and scripture reads run together.
+
+Runs the app on a local threaded server against a throwaway SQLite database
+with one user and one stored verse, so no api.bible key is needed:
+
+    cd backend
+    python benchmarks/login_mixed_load.py --duration 10
+    PASSWORD_HASH_WORKERS=0 python benchmarks/login_mixed_load.py   # inline bcrypt, for comparison
+    python benchmarks/login_mixed_load.py --gunicorn                 # production server, Docker sizing
+
+The default werkzeug server starts a thread per request, so it can't show
+thread starvation; --gunicorn runs WEB_WORKERS x WEB_THREADS like the image.
+"""
+import argparse
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{DB_PATH}"
+os.environ.setdefault('LOGIN_RATE_PER_IP', '1000000')
+os.environ.setdefault('LOGIN_RATE_PER_EMAIL', '1000000')
+
+from werkzeug.serving import make_server  # noqa: E402
+
+import app as backend  # noqa: E402
+
+EMAIL = 'bench@example.com'
+PASSWORD = 'correct horse battery staple'
+
+
+def seed(application):
+    with application.app_context():
+        backend.run_migrations(backend.db.engine)
+        backend.db.session.add(backend.Users(
+            username='bench', email=EMAIL, password=backend.password_hasher().hash(PASSWORD), avatar=b''
+        ))
+        backend.db.session.add(backend.Books(id='JHN', position=0, payload={'id': 'JHN'}))
+        backend.db.session.add(backend.Chapters(id='JHN.3', book_id='JHN', position=0, payload={}, verses_payload={}))
+        backend.db.session.add(backend.Verses(
+            id='JHN.3.16', book_id='JHN', chapter_id='JHN.3', position=0,
+            text='For God so loved the world', payload={'data': {'id': 'JHN.3.16'}}
+        ))
+        backend.db.session.commit()
+
+
+def percentile(samples, pct):
+    if not samples:
+        return float('nan')
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def run_load(base_url, duration, login_threads, scripture_threads):
+    stop = time.monotonic() + duration
+    logins = []
+    scripture_latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def login_loop():
+        session = requests.Session()
+        while time.monotonic() < stop:
+            response = session.post(f"{base_url}/api/auth/login", json={'email': EMAIL, 'password': PASSWORD})
+            with lock:
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code == 200:
+                    logins.append(1)
+
+    def scripture_loop():
+        session = requests.Session()
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            session.get(f"{base_url}/api/scripture", params={'verse_id': 'JHN.3.16'})
+            with lock:
+                scripture_latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=login_loop) for _ in range(login_threads)]
+    threads += [threading.Thread(target=scripture_loop) for _ in range(scripture_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(logins) / duration, scripture_latencies, statuses
+
+
+def report(label, logins_per_sec, latencies, statuses):
+    print(f"{label}:")
+    if statuses:
+        print(f"  logins/sec: {logins_per_sec:.1f}  (status counts: {statuses})")
+    print(f"  scripture requests: {len(latencies)}  "
+          f"p50 {percentile(latencies, 50) * 1000:.2f}ms  "
+          f"p95 {percentile(latencies, 95) * 1000:.2f}ms  "
+          f"p99 {percentile(latencies, 99) * 1000:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--login-threads', type=int, default=8)
+    parser.add_argument('--scripture-threads', type=int, default=4)
+    parser.add_argument('--gunicorn', action='store_true', help="Serve with gunicorn instead of werkzeug")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_WORKERS', 2)))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WEB_THREADS', 2)))
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    application = backend.create_app()
+    seed(application)
+    hasher = backend.password_hasher()
+    if args.gunicorn:
+        base_url, stop = start_gunicorn(args.workers, args.threads)
+        print(f"gunicorn workers={args.workers} threads={args.threads} bcrypt rounds={hasher.rounds}")
+    else:
+        server = make_server('127.0.0.1', 0, application, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url, stop = f"http://127.0.0.1:{server.server_port}", server.shutdown
+        print(f"werkzeug bcrypt rounds={hasher.rounds} hash workers={hasher.workers}")
+
+    try:
+        report("scripture only", *run_load(base_url, args.duration, 0, args.scripture_threads))
+        report("mixed login + scripture", *run_load(base_url, args.duration, args.login_threads, args.scripture_threads))
+    finally:
+        stop()
+
+
+def start_gunicorn(workers, threads):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    env = dict(os.environ, WEB_WORKERS=str(workers), WEB_THREADS=str(threads))
+    process = subprocess.Popen(
+        ['gunicorn', '--bind', f"127.0.0.1:{port}", '--workers', str(workers), '--threads', str(threads),
+         '--timeout', '120', 'app:create_app()'],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            requests.get(f"{base_url}/", timeout=1)
+            break
+        except requests.ConnectionError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise SystemExit("gunicorn did not start")
+            time.sleep(0.2)
+
+    def stop():
+        process.terminate()
+        process.wait(timeout=30)
+    return base_url, stop
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Cold-start cost of a worker: import + create_app, then the first requests.
+
+Each sample runs in a fresh interpreter, as a newly forked gunicorn worker
+would, against a throwaway migrated SQLite database:
+
+    cd backend
+    python benchmarks/startup.py --runs 5
+
+Exits 1 when a median exceeds its budget, a first request fails, or a
+heavy module (NumPy, Pillow, requests) is imported by create_app, so it
+can gate CI. Budgets are generous defaults; tighten them per machine.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run inside each fresh interpreter; prints one JSON line of timings
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+application = create_app()
+timings = {"create_app_ms": (time.perf_counter() - started) * 1000}
+lazy = ["numpy", "PIL", "requests"]
+timings["heavy_modules_loaded"] = [name for name in lazy if name in sys.modules]
+client = application.test_client()
+for label, path in [("first_liveness_ms", "/"), ("first_ready_ms", "/ready"),
+                    ("first_scripture_ms", "/api/scripture?verse_id=JHN.3.16")]:
+    started = time.perf_counter()
+    status = client.get(path).status_code
+    timings[label] = (time.perf_counter() - started) * 1000
+    timings[label.replace("_ms", "_status")] = status
+print(json.dumps(timings))
+'''
+
+
+def prepare_database(env):
+    setup = (
+        "from app import create_app, run_migrations\n"
+        "from models import db, Books, Chapters, Verses\n"
+        "app = create_app()\n"
+        "with app.app_context():\n"
+        "    run_migrations(db.engine)\n"
+        "    db.session.add(Books(id='JHN', position=0, payload={'id': 'JHN'}))\n"
+        "    db.session.add(Chapters(id='JHN.3', book_id='JHN', position=0, payload={}, verses_payload={}))\n"
+        "    db.session.add(Verses(id='JHN.3.16', book_id='JHN', chapter_id='JHN.3', position=0,\n"
+        "                          text='For God so loved the world', payload={'data': {'id': 'JHN.3.16'}}))\n"
+        "    db.session.commit()\n"
+    )
+    subprocess.run([sys.executable, '-c', setup], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-create-app-ms', type=float, default=1500)
+    parser.add_argument('--max-first-request-ms', type=float, default=500)
+    args = parser.parse_args()
+
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}")
+    prepare_database(env)
+
+    samples = []
+    for _ in range(args.runs):
+        result = subprocess.run([sys.executable, '-c', PROBE], cwd=BACKEND_DIR, env=env,
+                                check=True, capture_output=True, text=True)
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    failures = []
+    for key in ('create_app_ms', 'first_liveness_ms', 'first_ready_ms', 'first_scripture_ms'):
+        values = [sample[key] for sample in samples]
+        median = statistics.median(values)
+        print(f"{key:>20}: median {median:8.2f}  max {max(values):8.2f}")
+        budget = args.max_create_app_ms if key == 'create_app_ms' else args.max_first_request_ms
+        if median > budget:
+            failures.append(f"{key} median {median:.2f}ms exceeds {budget:.0f}ms")
+    print(f"{'statuses':>20}: " + ", ".join(
+        f"{key}={samples[-1][key]}" for key in samples[-1] if key.endswith('_status')))
+    print(f"{'heavy modules loaded':>20}: {samples[-1]['heavy_modules_loaded'] or 'none'}")
+
+    for sample in samples:
+        failures += [f"{key}={sample[key]}" for key in sample if key.endswith('_status') and sample[key] != 200]
+        failures += [f"create_app imported {name}" for name in sample['heavy_modules_loaded']]
+    if failures:
+        print("FAILED:")
+        for failure in sorted(set(failures)):
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
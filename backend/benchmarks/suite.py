@@ -0,0 +1,386 @@
+"""Throughput and p50/p95/p99 latency for every route, against a local api.bible stub.
+
+Starts a stub of the api.bible endpoints the app calls (with configurable
+latency), runs the app on a local threaded server against a throwaway
+SQLite database (or --database-url, e.g. a scratch Postgres), ingests one
+book and builds the search index, then drives each route in turn:
+
+    cd backend
+    python benchmarks/suite.py --duration 5 --concurrency 4 --json results.json
+    python benchmarks/suite.py --compare results.json       # exits 1 on regressions
+    python benchmarks/suite.py --only scripture --only batch
+
+JHN is ingested into the local store; GEN is only served by the stub, so
+those scenarios measure the upstream + cache path. BCRYPT_ROUNDS defaults
+to 4 and the hash limit to --concurrency here so auth routes measure
+request handling; login_mixed_load.py covers hashing cost and back-pressure.
+"""
+import argparse
+import io
+import itertools
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BIBLE_BOOKS = [('GEN', 'Genesis', 2), ('JHN', 'John', 3)]
+WORDS = ('in the beginning was the word and the word was with god light shined in darkness '
+         'for god so loved the world that he gave his only begotten son whosoever believeth').split()
+
+
+def verse_text(book, chapter, number):
+    # Deterministic filler so every run indexes and searches the same corpus
+    start = (chapter * 7 + number * 3 + len(book)) % len(WORDS)
+    return ' '.join(WORDS[(start + i) % len(WORDS)] for i in range(12))
+
+
+class BibleStub:
+    """Answers the api.bible paths the app uses, in api.bible's response shapes."""
+
+    def __init__(self, bible_id, verses_per_chapter, latency):
+        self.bible_id = bible_id
+        self.verses_per_chapter = verses_per_chapter
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def book(self, book_id):
+        for book, name, chapters in BIBLE_BOOKS:
+            if book == book_id:
+                return book, name, chapters
+        return None
+
+    def chapter(self, chapter_id):
+        book_id, _, number = chapter_id.partition('.')
+        book = self.book(book_id)
+        if book and number.isdigit() and 1 <= int(number) <= book[2]:
+            return book, int(number)
+        return None
+
+    def route(self, path):
+        parts = path.strip('/').split('/')
+        if parts[:3] != ['v1', 'bibles', self.bible_id] or len(parts) < 4:
+            return None
+        rest = parts[3:]
+        if rest == ['books']:
+            return {'data': [{'id': book, 'bibleId': self.bible_id, 'abbreviation': book.title(),
+                              'name': name, 'nameLong': f"The Book of {name}"} for book, name, _ in BIBLE_BOOKS]}
+        if len(rest) == 3 and rest[0] == 'books' and rest[2] == 'chapters' and self.book(rest[1]):
+            book, name, chapters = self.book(rest[1])
+            return {'data': [{'id': f"{book}.{number}", 'bibleId': self.bible_id, 'number': str(number),
+                              'bookId': book, 'reference': f"{name} {number}"} for number in range(1, chapters + 1)]}
+        if rest[0] == 'chapters' and len(rest) in (2, 3) and self.chapter(rest[1]):
+            (book, name, _), number = self.chapter(rest[1])
+            if len(rest) == 3 and rest[2] == 'verses':
+                return {'data': [{'id': f"{book}.{number}.{verse}", 'orgId': f"{book}.{number}.{verse}",
+                                  'bibleId': self.bible_id, 'bookId': book, 'chapterId': f"{book}.{number}",
+                                  'reference': f"{name} {number}:{verse}"}
+                                 for verse in range(1, self.verses_per_chapter + 1)]}
+            if len(rest) == 2:
+                content = ''.join(f'<p class="p"><span data-number="{verse}" class="v">{verse}</span>'
+                                  f'{verse_text(book, number, verse)}</p>'
+                                  for verse in range(1, self.verses_per_chapter + 1))
+                return {'data': {'id': f"{book}.{number}", 'bibleId': self.bible_id, 'number': str(number),
+                                 'bookId': book, 'reference': f"{name} {number}", 'content': content,
+                                 'verseCount': self.verses_per_chapter}}
+        if len(rest) == 2 and rest[0] == 'verses':
+            match = re.match(r'^([0-9A-Z]+)\.(\d+)\.(\d+)$', rest[1])
+            if match and self.chapter(f"{match.group(1)}.{match.group(2)}") \
+                    and 1 <= int(match.group(3)) <= self.verses_per_chapter:
+                (book, name, _), number = self.chapter(f"{match.group(1)}.{match.group(2)}")
+                verse = int(match.group(3))
+                return {'data': {'id': rest[1], 'orgId': rest[1], 'bibleId': self.bible_id, 'bookId': book,
+                                 'chapterId': f"{book}.{number}", 'reference': f"{name} {number}:{verse}",
+                                 'content': f'<p class="p"><span data-number="{verse}" class="v">{verse}</span>'
+                                            f'{verse_text(book, number, verse)}</p>',
+                                 'verseCount': 1, 'copyright': 'PUBLIC DOMAIN'}}
+        return None
+
+    def serve(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                payload = stub.route(self.path.split('?')[0])
+                status = 200
+                if payload is None:
+                    status = 404
+                    payload = {'statusCode': 404, 'error': 'Not Found', 'message': f"{self.path} not found"}
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def percentile(samples, pct):
+    if not samples:
+        return float('nan')
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def avatar_png():
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (320, 320), (120, 80, 200)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def scenarios(state):
+    """(name, expected statuses, build) where build() returns requests kwargs, or None once exhausted."""
+    counter = itertools.count()
+    suffix = state['suffix']
+    avatar = avatar_png()
+
+    def signup():
+        n = next(counter)
+        return {'method': 'POST', 'url': '/api/users', 'data': {
+            'username': f"bench-{suffix}-{n}", 'email': f"bench-{suffix}-{n}@example.com", 'password': 'bench-password'}}
+
+    def delete():
+        try:
+            return {'method': 'DELETE', 'url': f"/api/users/{state['created'].pop()}"}
+        except IndexError:
+            return None
+
+    verse_ids = itertools.cycle([f"JHN.3.{verse}" for verse in range(1, 21)])
+    upstream_ids = itertools.cycle([f"GEN.1.{verse}" for verse in range(1, 21)])
+    login, update = state['login_user'], state['update_user']
+    return [
+        ('liveness', (200,), lambda: {'method': 'GET', 'url': '/'}),
+        ('test', (200,), lambda: {'method': 'GET', 'url': '/test'}),
+        ('ready', (200,), lambda: {'method': 'GET', 'url': '/ready'}),
+        ('metrics', (200,), lambda: {'method': 'GET', 'url': '/metrics'}),
+        ('books', (200,), lambda: {'method': 'GET', 'url': '/api/books'}),
+        ('bibles.store', (200,), lambda: {'method': 'GET', 'url': '/api/bibles', 'params': {'book': 'JHN', 'chapter': '3'}}),
+        ('bibles.upstream', (200,), lambda: {'method': 'GET', 'url': '/api/bibles', 'params': {'book': 'GEN', 'chapter': '1'}}),
+        ('scripture.store', (200,), lambda: {'method': 'GET', 'url': '/api/scripture', 'params': {'verse_id': next(verse_ids)}}),
+        ('scripture.upstream', (200,), lambda: {'method': 'GET', 'url': '/api/scripture', 'params': {'verse_id': next(upstream_ids)}}),
+        ('scripture.not_modified', (304,), lambda: {'method': 'GET', 'url': '/api/scripture',
+                                                    'params': {'verse_id': 'JHN.3.16'}, 'headers': {'If-None-Match': state['etag']}}),
+        ('chapter.store', (200,), lambda: {'method': 'GET', 'url': '/api/chapter', 'params': {'chapter_id': 'JHN.3'}}),
+        ('chapter.upstream', (200,), lambda: {'method': 'GET', 'url': '/api/chapter', 'params': {'chapter_id': 'GEN.2'}}),
+        ('batch', (200,), lambda: {'method': 'POST', 'url': '/api/scripture/batch',
+                                   'json': {'references': ['JHN.3.16', 'JHN.3.1-JHN.3.8', 'JHN.2', 'GEN.1', 'GEN.2.3']}}),
+        ('search', (200,), lambda: {'method': 'GET', 'url': '/api/search', 'params': {'q': 'god so loved the world'}}),
+        ('search.filtered', (200,), lambda: {'method': 'GET', 'url': '/api/search',
+                                             'params': {'q': 'light darkness', 'book': 'JHN', 'limit': 25}}),
+        ('users.signup', (201,), signup),
+        ('users.login', (200,), lambda: {'method': 'POST', 'url': '/api/auth/login',
+                                         'json': {'email': login['email'], 'password': 'bench-password'}}),
+        ('users.list_page', (200,), lambda: {'method': 'GET', 'url': '/api/users', 'params': {'limit': 50}}),
+        ('users.list_stream', (200,), lambda: {'method': 'GET', 'url': '/api/users'}),
+        ('users.get', (200,), lambda: {'method': 'GET', 'url': f"/api/users/{login['id']}"}),
+        ('users.update', (200,), lambda: {'method': 'PUT', 'url': f"/api/users/{update['id']}", 'json': {
+            'username': update['username'], 'email': update['email'], 'password': 'bench-password'}}),
+        ('users.avatar_put', (200,), lambda: {'method': 'PUT', 'url': f"/api/users/{update['id']}/avatar",
+                                              'files': {'avatar': ('avatar.png', avatar, 'image/png')}}),
+        ('users.avatar_get', (200,), lambda: {'method': 'GET', 'url': f"/api/users/{update['id']}/avatar",
+                                              'params': {'size': 64}, 'headers': {'Accept': 'image/webp'}}),
+        ('users.delete', (200,), delete),
+    ]
+
+
+def run_scenario(base_url, build, expected, duration, concurrency, warmup, on_response=None):
+    stop = time.monotonic() + duration
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def send(session):
+        kwargs = build()
+        if kwargs is None:
+            return None
+        kwargs['url'] = base_url + kwargs['url']
+        started = time.perf_counter()
+        # Read the whole body so streamed routes are timed to their last byte
+        response = session.request(**kwargs)
+        elapsed = time.perf_counter() - started
+        if on_response:
+            on_response(response)
+        return response.status_code, elapsed
+
+    def loop():
+        session = requests.Session()
+        while time.monotonic() < stop:
+            result = send(session)
+            if result is None:
+                break
+            with lock:
+                statuses[result[0]] = statuses.get(result[0], 0) + 1
+                latencies.append(result[1])
+
+    session = requests.Session()
+    for _ in range(warmup):
+        send(session)
+    started = time.monotonic()
+    threads = [threading.Thread(target=loop) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    errors = sum(count for status, count in statuses.items() if status not in expected)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'rps': len(latencies) / elapsed if elapsed else 0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def db_queries_per_request(base_url):
+    # Mean SQL statements per request by route, from the app's own /metrics
+    text = requests.get(f"{base_url}/metrics").text
+    totals = {}
+    for kind, route, value in re.findall(r'^db_queries_per_request_(sum|count)\{route="([^"]*)",[^}]*\} (\S+)$', text, re.M):
+        totals.setdefault(route, {})[kind] = float(value)
+    return {route: values['sum'] / values['count'] for route, values in totals.items() if values.get('count')}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before or not result['requests'] or not before['requests']:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms")
+        if result['rps'] < before['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['rps']:.1f}/s -> {result['rps']:.1f}/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=5, help="Seconds per scenario")
+    parser.add_argument('--concurrency', type=int, default=4, help="Client threads per scenario")
+    parser.add_argument('--warmup', type=int, default=5, help="Unrecorded requests before each scenario")
+    parser.add_argument('--upstream-latency-ms', type=float, default=50, help="Delay added by the api.bible stub")
+    parser.add_argument('--verses-per-chapter', type=int, default=25)
+    parser.add_argument('--database-url', default=None, help="Defaults to a throwaway SQLite file; the suite writes to it")
+    parser.add_argument('--only', action='append', default=[], help="Run scenarios whose name starts with this (repeatable)")
+    parser.add_argument('--json', dest='json_path', default=None, help="Write results to this file")
+    parser.add_argument('--compare', default=None, help="Baseline JSON from an earlier --json run")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed p95/throughput change before flagging")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bible-bench-')
+    stub = BibleStub('de4e12af7f28f599-02', args.verses_per_chapter, args.upstream_latency_ms / 1000)
+    stub_server = stub.serve()
+    os.environ.update({
+        'DATABASE_URL': args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'BIBLE_API_URL': f"http://127.0.0.1:{stub_server.server_port}/v1",
+        'API_KEY': 'bench',
+        'SEARCH_INDEX_DIR': os.path.join(workdir, 'search_index'),
+    })
+    # Room for every client thread to hash at once; login_mixed_load.py --gunicorn covers back-pressure
+    for name, value in [('BCRYPT_ROUNDS', '4'), ('PASSWORD_HASH_MAX_PENDING', str(args.concurrency)),
+                        ('LOGIN_RATE_PER_IP', '1000000'), ('LOGIN_RATE_PER_EMAIL', '1000000')]:
+        os.environ.setdefault(name, value)
+
+    sys.path.insert(0, BACKEND_DIR)
+    from werkzeug.serving import make_server
+
+    import app as backend
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    application = backend.create_app()
+    cli = application.test_cli_runner()
+    for command in (['migrate'], ['ingest-bible', '--book', 'JHN'], ['build-search-index']):
+        result = cli.invoke(args=command)
+        if result.exit_code != 0:
+            raise SystemExit(f"`flask {' '.join(command)}` failed:\n{result.output}{result.exception or ''}")
+
+    suffix = f"{os.getpid()}-{int(time.time())}"
+    state = {'suffix': suffix, 'created': []}
+    with application.app_context():
+        for role in ('login_user', 'update_user'):
+            user = backend.Users(username=f"{role}-{suffix}", email=f"{role}-{suffix}@example.com",
+                                 password=backend.password_hasher().hash('bench-password'), avatar=b'')
+            backend.db.session.add(user)
+            backend.db.session.commit()
+            state[role] = {'id': user.id, 'username': user.username, 'email': user.email}
+
+    server = make_server('127.0.0.1', 0, application, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    state['etag'] = requests.get(f"{base_url}/api/scripture", params={'verse_id': 'JHN.3.16'}).headers.get('ETag', '')
+    requests.put(f"{base_url}/api/users/{state['update_user']['id']}/avatar",
+                 files={'avatar': ('avatar.png', avatar_png(), 'image/png')})
+
+    def remember_created(response):
+        if response.status_code == 201:
+            state['created'].append(response.json()['id'])
+
+    print(f"database={os.environ['DATABASE_URL'].split(':')[0]} "
+          f"duration={args.duration}s concurrency={args.concurrency} upstream latency={args.upstream_latency_ms}ms "
+          f"bcrypt rounds={backend.password_hasher().rounds}")
+    print(f"{'scenario':<24}{'requests':>9}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    results = {}
+    try:
+        for name, expected, build in scenarios(state):
+            if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                continue
+            # users.delete consumes the ids that users.signup created
+            on_response = remember_created if name == 'users.signup' else None
+            result = run_scenario(base_url, build, expected, args.duration, args.concurrency,
+                                  args.warmup, on_response)
+            results[name] = result
+            print(f"{name:<24}{result['requests']:>9}{result['errors']:>8}{result['rps']:>10.1f}"
+                  f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+        queries = db_queries_per_request(base_url)
+    finally:
+        server.shutdown()
+        stub_server.shutdown()
+
+    print(f"upstream stub requests: {stub.requests}")
+    print("mean SQL statements per request:")
+    for route, mean in sorted(queries.items()):
+        print(f"  {route:<32}{mean:.2f}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'settings': vars(args), 'scenarios': results, 'db_queries_per_request': queries}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
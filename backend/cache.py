@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """In-process cache with a size limit and per-entry TTL (one per gunicorn worker)."""
+
+    def __init__(self, max_entries=2048, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._data)
+
+
+class FileCache:
+    """Shared second tier: one JSON file per key, visible to every worker on the host."""
+
+    def __init__(self, directory, ttl=86400):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value):
+        # Write to a temp file and rename so readers never see a partial file
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+
+class RedisCache:
+    """Shared second tier backed by any Redis-compatible server."""
+
+    def __init__(self, url, ttl=86400, prefix='bible:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("REDIS_URL is set but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+
+class _Flight:
+    """One in-progress load that concurrent misses for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TieredCache:
+    """LRU in front of an optional shared tier, with request coalescing on misses.
+
+    Concurrent misses for the same key wait for a single call to the loader
+    instead of each hitting the upstream API; if that call fails, every
+    waiter gets its error rather than retrying on its own.
+    """
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get_or_load(self, key, loader):
+        value = self.local.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            self._count('hits')
+            return flight.value
+
+        try:
+            value = self._get_shared(key)
+            if value is not None:
+                self._count('shared_hits')
+            else:
+                self._count('misses')
+                value = loader()
+                self._set_shared(key, value)
+            self.local.set(key, value)
+            flight.value = value
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def _get_shared(self, key):
+        if self.shared is None:
+            return None
+        try:
+            return self.shared.get(key)
+        except Exception as e:
+            print(f"Shared cache read failed: {str(e)}")
+            return None
+
+    def _set_shared(self, key, value):
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(key, value)
+        except Exception as e:
+            print(f"Shared cache write failed: {str(e)}")
+
+    def shared_health(self):
+        if self.shared is None:
+            return 'disabled'
+        try:
+            self.shared.get('__health__')
+            return 'ok'
+        except Exception as e:
+            return f"error: {str(e)}"
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'evictions': self.local.evictions,
+            'entries': len(self.local),
+        }
+
+
+def cache_from_env():
+    ttl = int(os.getenv('CACHE_TTL', 86400))
+    local = LRUCache(max_entries=int(os.getenv('CACHE_MAX_ENTRIES', 2048)), ttl=ttl)
+    shared = None
+    if os.getenv('REDIS_URL'):
+        shared = RedisCache(os.getenv('REDIS_URL'), ttl=ttl)
+    elif os.getenv('CACHE_DIR'):
+        shared = FileCache(os.getenv('CACHE_DIR'), ttl=ttl)
+    return TieredCache(local, shared)
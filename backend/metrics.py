@@ -0,0 +1,194 @@
+"""Request instrumentation exposed in Prometheus text format on /metrics.
+
+Metrics live in process memory, so each gunicorn worker reports its own
+series (labelled with `worker`, the pid). Sum across workers in queries.
+
+Set PROFILE_SLOW_MS to profile every request with cProfile and dump the
+stats of those slower than the threshold into PROFILE_DIR; it adds real
+overhead, so enable it only while investigating.
+"""
+import os
+import re
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self, extra):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key + extra)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total, observations = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            # Buckets are cumulative: each one counts every observation at or below its bound
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, observations + 1)
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self, extra):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, observations) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(key + extra + (('le', bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key + extra + (('le', '+Inf'),))} {observations}")
+                lines.append(f"{self.name}_sum{_format_labels(key + extra)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key + extra)} {observations}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', "Time spent handling a request, by route.")
+UPSTREAM_LATENCY = Histogram('upstream_request_duration_seconds', "api.bible call duration, by outcome.")
+DB_QUERY_LATENCY = Histogram('db_query_duration_seconds', "SQL statement execution time.")
+DB_QUERIES_PER_REQUEST = Histogram('db_queries_per_request', "SQL statements issued per request, by route.", COUNT_BUCKETS)
+PASSWORD_HASH_LATENCY = Histogram('password_hash_duration_seconds', "bcrypt hash/check time including pool queueing.")
+SLOW_REQUEST_PROFILES = Counter('slow_request_profiles_total', "Requests whose cProfile stats were dumped.")
+
+METRICS = [REQUEST_LATENCY, UPSTREAM_LATENCY, DB_QUERY_LATENCY, DB_QUERIES_PER_REQUEST,
+           PASSWORD_HASH_LATENCY, SLOW_REQUEST_PROFILES]
+
+# Callables returning {name: (type, documentation, value)}, evaluated at scrape time
+COLLECTORS = []
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if started:
+        DB_QUERY_LATENCY.observe(time.perf_counter() - started.pop())
+    if has_request_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    # Failed statements never reach after_cursor_execute; drop their start time
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def render():
+    extra = (('worker', os.getpid()),)
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render(extra))
+    for collect in COLLECTORS:
+        for name, (kind, documentation, value) in sorted(collect().items()):
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{_format_labels(extra)} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    profile_slow_ms = float(os.getenv('PROFILE_SLOW_MS', 0))
+    profile_dir = os.getenv('PROFILE_DIR', '/tmp/profiles')
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        g.db_queries = 0
+        if profile_slow_ms:
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                g.profiler = profiler
+            except ValueError:
+                # Python 3.12+ allows one active profiler per process; skip overlapping requests
+                pass
+
+    @app.after_request
+    def record_request(response):
+        # Streamed bodies are produced after this point, so their latency covers setup only
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = _route()
+        REQUEST_LATENCY.observe(elapsed, method=request.method, route=route, status=response.status_code)
+        DB_QUERIES_PER_REQUEST.observe(g.get('db_queries', 0), route=route)
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            if elapsed * 1000 >= profile_slow_ms:
+                os.makedirs(profile_dir, exist_ok=True)
+                slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+                name = f"{int(time.time() * 1000)}-{request.method}-{slug}-{int(elapsed * 1000)}ms.prof"
+                profiler.dump_stats(os.path.join(profile_dir, name))
+                SLOW_REQUEST_PROFILES.inc(route=route)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,90 @@
+"""Versioned schema migrations, applied with `flask --app app migrate`.
+
+Each migration runs once, in order, inside a single transaction, and is
+recorded in the schema_migrations table. Add new steps to the end of
+MIGRATIONS; never edit one that has already shipped.
+"""
+from sqlalchemy import (JSON, Column, ForeignKey, Index, Integer, LargeBinary, MetaData, String, Table, Text,
+                        UniqueConstraint, text)
+
+# Arbitrary key for pg_advisory_xact_lock so concurrent deploys don't migrate twice
+MIGRATION_LOCK_ID = 7411
+
+
+def create_base_tables(connection):
+    # A frozen snapshot of the tables as they stood when migrations were introduced,
+    # deliberately independent of models.py; later schema changes need their own step.
+    # checkfirst lets databases that predate migrations (where create_all ran at
+    # startup) pick up from here unchanged.
+    metadata = MetaData()
+    Table('users', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('username', String(80), unique=True, nullable=False),
+          Column('email', String(120), unique=True, nullable=False),
+          Column('password', String(120), nullable=False),
+          Column('avatar', LargeBinary, nullable=False))
+    Table('avatars', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+          Column('size', Integer, nullable=False),
+          Column('format', String(8), nullable=False),
+          Column('digest', String(64), nullable=False),
+          Column('data', LargeBinary, nullable=False),
+          UniqueConstraint('user_id', 'size', 'format'))
+    Table('books', metadata,
+          Column('id', String(16), primary_key=True),
+          Column('position', Integer, nullable=False),
+          Column('payload', JSON, nullable=False),
+          Index('ix_books_position', 'position'))
+    Table('chapters', metadata,
+          Column('id', String(32), primary_key=True),
+          Column('book_id', String(16), ForeignKey('books.id'), nullable=False),
+          Column('position', Integer, nullable=False),
+          Column('payload', JSON, nullable=False),
+          Column('verses_payload', JSON, nullable=False),
+          Index('ix_chapters_book_id', 'book_id'))
+    Table('verses', metadata,
+          Column('id', String(32), primary_key=True),
+          Column('book_id', String(16), nullable=False),
+          Column('chapter_id', String(32), ForeignKey('chapters.id'), nullable=False),
+          Column('position', Integer, nullable=False),
+          Column('text', Text, nullable=False),
+          Column('payload', JSON, nullable=False),
+          Index('ix_verses_book_id', 'book_id'),
+          Index('ix_verses_chapter_id', 'chapter_id'))
+    metadata.create_all(connection, checkfirst=True)
+
+
+MIGRATIONS = [
+    (1, "Create base tables", create_base_tables),
+    (2, "Covering index for keyset user listing",
+     "CREATE INDEX IF NOT EXISTS ix_users_listing ON users (id, username, email)"),
+]
+
+
+def run_migrations(engine):
+    """Apply pending migrations; returns the (version, description) pairs applied."""
+    applied_now = []
+    with engine.begin() as connection:
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {'id': MIGRATION_LOCK_ID})
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, "
+            "description VARCHAR(200) NOT NULL, "
+            "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        applied = {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+        for version, description, step in MIGRATIONS:
+            if version in applied:
+                continue
+            if callable(step):
+                step(connection)
+            else:
+                connection.execute(text(step))
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                {'version': version, 'description': description}
+            )
+            applied_now.append((version, description))
+    return applied_now
@@ -0,0 +1,71 @@
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+class Users(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password = db.Column(db.String(120), nullable=False)
+    # Legacy raw uploads only; new avatars live in the avatars table. Deferred so
+    # ordinary user queries never pull the blob.
+    avatar = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    # Lets keyset listing be answered from the index alone
+    __table_args__ = (db.Index('ix_users_listing', 'id', 'username', 'email'),)
+
+    def avatar_url(self):
+        digest = db.session.query(Avatars.digest).filter_by(user_id=self.id).limit(1).scalar()
+        if digest:
+            # Versioned by content hash so the image can be cached forever
+            return f"/api/users/{self.id}/avatar?v={digest[:16]}"
+        # A legacy upload is converted on first request; checked by length so the blob isn't loaded
+        if db.session.query(db.func.length(Users.avatar)).filter_by(id=self.id).scalar():
+            return f"/api/users/{self.id}/avatar"
+        return None
+
+    def json(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'email': self.email,
+            'password': self.password,
+            'avatar': self.avatar_url()
+        }
+
+# Resized avatar thumbnails, one row per (user, size, format)
+class Avatars(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    format = db.Column(db.String(8), nullable=False)
+    digest = db.Column(db.String(64), nullable=False)
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    __table_args__ = (db.UniqueConstraint('user_id', 'size', 'format'),)
+
+def save_avatar(user_id, digest, thumbnails):
+    Avatars.query.filter_by(user_id=user_id).delete()
+    for (size, fmt), data in thumbnails.items():
+        db.session.add(Avatars(user_id=user_id, size=size, format=fmt, digest=digest, data=data))
+
+# Local copy of the translation, filled by `flask ingest-bible`.
+# Payloads are stored exactly as api.bible returned them so the routes
+# can keep answering with the same response shape.
+class Books(db.Model):
+    id = db.Column(db.String(16), primary_key=True)
+    position = db.Column(db.Integer, nullable=False, index=True)
+    payload = db.Column(db.JSON, nullable=False)
+
+class Chapters(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    book_id = db.Column(db.String(16), db.ForeignKey('books.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    verses_payload = db.Column(db.JSON, nullable=False)
+
+class Verses(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    book_id = db.Column(db.String(16), nullable=False, index=True)
+    chapter_id = db.Column(db.String(32), db.ForeignKey('chapters.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)
+    text = db.Column(db.Text, nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
@@ -0,0 +1,105 @@
+import os
+import threading
+
+import bcrypt
+
+from metrics import PASSWORD_HASH_LATENCY
+
+
+class HashQueueFull(Exception):
+    """Too many hashes are already queued; the caller should answer 429."""
+
+
+class HashTimeout(HashQueueFull):
+    """A queued hash did not finish within the timeout; answered like a full queue."""
+
+
+# Run in the pool's child processes, so they must stay importable top-level functions
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+def hash_cost(hashed):
+    # bcrypt hashes look like $2b$12$<salt+hash>; the middle field is the cost factor
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded process pool, capping how many request threads it can hold.
+
+    The calling thread still waits for its hash, so `max_pending` is the
+    number of request threads per worker that hashing may occupy; beyond
+    that calls fail fast with HashQueueFull. Keep it below the thread count
+    so other routes always have a thread. With workers=0 hashing runs
+    inline on the calling thread.
+    """
+
+    def __init__(self, rounds=12, workers=1, max_pending=1, timeout=10):
+        self.rounds = rounds
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created on first use, i.e. after gunicorn has forked this worker. Spawned
+        # children avoid inheriting the worker's threads and DB connections.
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashQueueFull()
+        if self.workers == 0:
+            try:
+                return fn(*args)
+            finally:
+                self._slots.release()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashTimeout()
+
+    def hash(self, password):
+        with PASSWORD_HASH_LATENCY.time(operation='hash'):
+            return self._run(_hash, password.encode('utf-8'), self.rounds)
+
+    def check(self, password, hashed):
+        with PASSWORD_HASH_LATENCY.time(operation='check'):
+            return self._run(_check, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        return hash_cost(hashed) < self.rounds
+
+
+def hasher_from_env():
+    # Leave at least one of the worker's gunicorn threads for non-auth routes
+    max_pending = int(os.getenv('PASSWORD_HASH_MAX_PENDING', max(1, int(os.getenv('WEB_THREADS', 2)) - 1)))
+    return PasswordHasher(
+        rounds=int(os.getenv('BCRYPT_ROUNDS', 12)),
+        workers=int(os.getenv('PASSWORD_HASH_WORKERS', max_pending)),
+        max_pending=max_pending,
+        timeout=float(os.getenv('PASSWORD_HASH_TIMEOUT', 10)),
+    )
@@ -0,0 +1,37 @@
+import threading
+import time
+from collections import deque
+
+
+class RateLimiter:
+    """Sliding-window limiter: at most `limit` hits per key every `window` seconds.
+
+    State is per gunicorn worker, so the effective limit is `limit` times the
+    number of workers; that is enough to keep credential stuffing from eating
+    the CPU without needing a shared store.
+    """
+
+    def __init__(self, limit, window=60, max_keys=100000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Record an attempt; returns seconds to wait if over the limit, else 0."""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._hits) >= self.max_keys:
+                self._prune(now)
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return hits[0] + self.window - now
+            hits.append(now)
+            return 0
+
+    def _prune(self, now):
+        for key in [key for key, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
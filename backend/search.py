@@ -0,0 +1,164 @@
+"""Verse search over the locally ingested translation.
+
+The index is built offline (`flask --app app build-search-index`) into a
+directory of NumPy arrays. Workers open the arrays memory-mapped and
+read-only, so every gunicorn worker on a host shares the same pages instead
+of holding its own copy.
+
+BM25 over ~31k verses is a handful of vectorised array operations per query
+term; the targets are p50 < 10ms and p99 < 50ms per query on one CPU core.
+"""
+import json
+import os
+import re
+
+import numpy as np
+
+NEW_TESTAMENT = {
+    'MAT', 'MRK', 'LUK', 'JHN', 'ACT', 'ROM', '1CO', '2CO', 'GAL', 'EPH', 'PHP', 'COL', '1TH', '2TH',
+    '1TI', '2TI', 'TIT', 'PHM', 'HEB', 'JAS', '1PE', '2PE', '1JN', '2JN', '3JN', 'JUD', 'REV',
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Rows of the embeddings matrix scored per batch, bounding temporary memory
+EMBEDDING_BATCH = 8192
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def testament(book_id):
+    return 'NT' if book_id in NEW_TESTAMENT else 'OT'
+
+
+def build_index(directory, verses, embeddings=None, k1=1.2, b=0.75):
+    """Write the index for `verses`, an ordered list of (verse_id, book_id, text).
+
+    `embeddings`, if given, is an (n_verses, dim) array in the same order.
+    """
+    os.makedirs(directory, exist_ok=True)
+    books = []
+    book_index = {}
+    doc_book = np.zeros(len(verses), dtype=np.int16)
+    doc_len = np.zeros(len(verses), dtype=np.float32)
+    postings = {}
+    for doc, (_, book_id, text) in enumerate(verses):
+        if book_id not in book_index:
+            book_index[book_id] = len(books)
+            books.append(book_id)
+        doc_book[doc] = book_index[book_id]
+        tokens = tokenize(text)
+        doc_len[doc] = len(tokens)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            postings.setdefault(token, []).append((doc, count))
+
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    for i, term in enumerate(terms):
+        offsets[i + 1] = offsets[i] + len(postings[term])
+    doc_ids = np.empty(offsets[-1], dtype=np.int32)
+    tfs = np.empty(offsets[-1], dtype=np.float32)
+    for i, term in enumerate(terms):
+        docs, counts = zip(*postings[term])
+        doc_ids[offsets[i]:offsets[i + 1]] = docs
+        tfs[offsets[i]:offsets[i + 1]] = counts
+
+    # Precompute the BM25 term weight for every posting so a query only sums slices
+    n_docs = len(verses)
+    avg_len = float(doc_len.mean()) if n_docs else 0.0
+    doc_freq = np.diff(offsets).astype(np.float32)
+    idf = np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+    norm = k1 * (1 - b + b * doc_len / (avg_len or 1.0))
+    weights = np.repeat(idf, np.diff(offsets)) * tfs * (k1 + 1) / (tfs + norm[doc_ids])
+
+    np.save(os.path.join(directory, 'offsets.npy'), offsets)
+    np.save(os.path.join(directory, 'doc_ids.npy'), doc_ids)
+    np.save(os.path.join(directory, 'weights.npy'), weights.astype(np.float32))
+    np.save(os.path.join(directory, 'doc_book.npy'), doc_book)
+    np.save(os.path.join(directory, 'verse_ids.npy'), np.array([verse[0] for verse in verses], dtype='U32'))
+    if embeddings is not None:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.shape[0] != n_docs:
+            raise ValueError(f"Expected {n_docs} embedding rows, got {embeddings.shape[0]}")
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        np.save(os.path.join(directory, 'embeddings.npy'), embeddings / np.where(norms == 0, 1, norms))
+    with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'terms': terms, 'books': books}, f)
+
+
+class SearchIndex:
+    def __init__(self, directory):
+        def load(name):
+            return np.load(os.path.join(directory, name), mmap_mode='r')
+
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.term_index = {term: i for i, term in enumerate(meta['terms'])}
+        self.books = meta['books']
+        self.offsets = load('offsets.npy')
+        self.doc_ids = load('doc_ids.npy')
+        self.weights = load('weights.npy')
+        self.doc_book = load('doc_book.npy')
+        self.verse_ids = load('verse_ids.npy')
+        embeddings_path = os.path.join(directory, 'embeddings.npy')
+        self.embeddings = load('embeddings.npy') if os.path.exists(embeddings_path) else None
+
+    def __len__(self):
+        return len(self.verse_ids)
+
+    def _mask(self, books=None, testament_filter=None):
+        allowed = [
+            i for i, book_id in enumerate(self.books)
+            if (not books or book_id in books) and (not testament_filter or testament(book_id) == testament_filter)
+        ]
+        if len(allowed) == len(self.books):
+            return None
+        return np.isin(self.doc_book, allowed)
+
+    def _top(self, scores, limit, mask, matched=None):
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        if matched is not None:
+            scores = np.where(matched, scores, -np.inf)
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(str(self.verse_ids[doc]), float(scores[doc])) for doc in top if np.isfinite(scores[doc])]
+
+    def search(self, query, limit=10, books=None, testament_filter=None):
+        """BM25 ranking; returns [(verse_id, score)] best first."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for token in set(tokenize(query)):
+            term = self.term_index.get(token)
+            if term is None:
+                continue
+            start, end = self.offsets[term], self.offsets[term + 1]
+            # Doc ids are unique within a posting list, so fancy-index addition is safe
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+        return self._top(scores, limit, self._mask(books, testament_filter), matched=scores > 0)
+
+    def embedding_for(self, verse_id):
+        matches = np.flatnonzero(self.verse_ids == verse_id)
+        if self.embeddings is None or not len(matches):
+            return None
+        return np.array(self.embeddings[matches[0]])
+
+    def similar(self, vector, limit=10, books=None, testament_filter=None):
+        """Cosine similarity against the embeddings matrix, scored in batches."""
+        if self.embeddings is None:
+            raise ValueError("This index was built without embeddings")
+        vector = np.asarray(vector, dtype=np.float32)
+        if vector.shape != (self.embeddings.shape[1],):
+            raise ValueError(f"Expected a vector of length {self.embeddings.shape[1]}")
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), EMBEDDING_BATCH):
+            scores[start:start + EMBEDDING_BATCH] = self.embeddings[start:start + EMBEDDING_BATCH] @ vector
+        return self._top(scores, limit, self._mask(books, testament_filter))
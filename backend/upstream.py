@@ -0,0 +1,166 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import UPSTREAM_LATENCY
+
+
+class UpstreamError(Exception):
+    """api.bible answered with an error; payload is its JSON body."""
+
+    def __init__(self, payload, status_code=None):
+        super().__init__(payload)
+        self.payload = payload
+        self.status_code = status_code
+
+
+class UpstreamUnavailable(UpstreamError):
+    """api.bible could not be reached, timed out, or the circuit breaker is open."""
+
+    def __init__(self, message):
+        super().__init__({"statusCode": 503, "error": "Service Unavailable", "message": message}, 503)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures and fails fast for `cooldown` seconds.
+
+    Once the cooldown has passed a single trial request is let through; its
+    outcome closes the breaker again or restarts the cooldown.
+    """
+
+    def __init__(self, threshold=5, cooldown=30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class BibleClient:
+    """Shared api.bible client: keep-alive pool, timeouts, retries and a circuit breaker."""
+
+    def __init__(self, base_url, bible_id, api_key, connect_timeout=3.05, read_timeout=10,
+                 retries=2, backoff=0.3, pool_size=10, breaker=None):
+        # Imported here so workers that never call api.bible don't pay for requests at startup
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.base_url = base_url.rstrip('/')
+        self.bible_id = bible_id
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self.pool_size = pool_size
+
+        # 429 is not retried and Retry-After is ignored: honouring it would hold a
+        # request thread for as long as api.bible asks, well past our timeouts
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+            respect_retry_after_header=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self._request_error = requests.RequestException
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['api-key'] = api_key or ''
+
+    def fetch(self, path):
+        if not self.breaker.allow():
+            UPSTREAM_LATENCY.observe(0, outcome='rejected')
+            raise UpstreamUnavailable("api.bible is unavailable, try again later")
+
+        url = f"{self.base_url}/bibles/{self.bible_id}/{path}"
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except self._request_error as e:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - started, outcome='unavailable')
+            self.breaker.record_failure()
+            raise UpstreamUnavailable(str(e))
+
+        if response.status_code >= 500 or response.status_code == 429:
+            # Being rate limited counts against the breaker so we back off instead of hammering
+            outcome = 'server_error' if response.status_code >= 500 else 'rate_limited'
+            self.breaker.record_failure()
+        else:
+            outcome = 'ok' if response.ok else 'client_error'
+            self.breaker.record_success()
+        UPSTREAM_LATENCY.observe(time.perf_counter() - started, outcome=outcome)
+
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {"statusCode": response.status_code, "message": response.text}
+        if not response.ok:
+            raise UpstreamError(payload, response.status_code)
+        return payload
+
+    def fetch_many(self, paths, fetch=None):
+        """Fetch several paths concurrently over the shared pool, in input order."""
+        fetch = fetch or self.fetch
+        paths = list(paths)
+        if len(paths) <= 1:
+            return [fetch(path) for path in paths]
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, len(paths))) as executor:
+            return list(executor.map(fetch, paths))
+
+    async def fetch_async(self, path):
+        return await asyncio.to_thread(self.fetch, path)
+
+    async def fetch_many_async(self, paths):
+        return await asyncio.gather(*(self.fetch_async(path) for path in paths))
+
+
+def client_from_env(base_url, bible_id, api_key):
+    return BibleClient(
+        base_url,
+        bible_id,
+        api_key,
+        connect_timeout=float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 3.05)),
+        read_timeout=float(os.getenv('UPSTREAM_READ_TIMEOUT', 10)),
+        retries=int(os.getenv('UPSTREAM_RETRIES', 2)),
+        pool_size=int(os.getenv('UPSTREAM_POOL_SIZE', 10)),
+        breaker=CircuitBreaker(
+            threshold=int(os.getenv('UPSTREAM_BREAKER_THRESHOLD', 5)),
+            cooldown=float(os.getenv('UPSTREAM_BREAKER_COOLDOWN', 30)),
+        ),
+    )